@@ -1,18 +1,19 @@
 import sys
 import os
+from collections import deque
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                            QLabel, QLineEdit, QComboBox, QCheckBox, QProgressBar, 
-                           QPushButton, QTextEdit, QFileDialog, QMessageBox, 
+                           QPushButton, QPlainTextEdit, QFileDialog, QMessageBox, 
                            QGroupBox)
-from PyQt5.QtCore import Qt, pyqtSignal, QObject
+from PyQt5.QtCore import Qt, pyqtSignal, QObject, QTimer, QEvent
+from PyQt5.QtGui import QTextCursor
 
 # Import the downloader class from main.py
 from main import YtDlpDownloader, check_dependencies
 
 class DownloaderSignals(QObject):
     """Signal class for communication between threads"""
-    log_message = pyqtSignal(str)
-    update_progress = pyqtSignal(str, object)
+    log_ready = pyqtSignal()
     download_complete = pyqtSignal()
     download_error = pyqtSignal(str)
 
@@ -23,16 +24,29 @@ class YtDlpGui(QMainWindow):
         # Create signals for thread communication
         self.signals = DownloaderSignals()
         
+        # Recent log messages; the log display only renders these
+        self._log_ring = deque(maxlen=5000)
+        self._log_stale = False
+        
+        # Batch log output so the log is redrawn at most every 50 ms
+        self.log_timer = QTimer(self)
+        self.log_timer.setSingleShot(True)
+        self.log_timer.setInterval(50)
+        self.log_timer.timeout.connect(self.flush_log)
+        
+        # Poll download progress at 10 Hz instead of on every yt-dlp hook
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(100)
+        self.progress_timer.timeout.connect(self.poll_progress)
+        
         # Connect signals to slots
-        self.signals.log_message.connect(self.log_message)
-        self.signals.update_progress.connect(self.update_progress)
+        self.signals.log_ready.connect(self.schedule_log_flush)
         self.signals.download_complete.connect(self.download_complete)
         self.signals.download_error.connect(self.download_error)
         
         # Create the downloader with callbacks
         self.downloader = YtDlpDownloader({
-            'log_message': self.signals.log_message.emit,
-            'update_progress': self.signals.update_progress.emit,
+            'log_ready': self.signals.log_ready.emit,
             'on_complete': self.signals.download_complete.emit,
             'on_error': self.signals.download_error.emit,
         })
@@ -123,8 +137,12 @@ class YtDlpGui(QMainWindow):
         log_group = QGroupBox("Log")
         log_layout = QVBoxLayout(log_group)
         
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(5000)
+        # Keep the cursor at the end so appends follow the bottom of the log
+        self.log_text.setCenterOnScroll(False)
+        self.log_text.ensureCursorVisible()
         
         log_layout.addWidget(self.log_text)
         main_layout.addWidget(log_group)
@@ -132,12 +150,16 @@ class YtDlpGui(QMainWindow):
         # Buttons section
         button_layout = QHBoxLayout()
         
+        self.save_log_button = QPushButton("Save Log...")
+        self.save_log_button.clicked.connect(self.save_log)
+        
         self.clear_button = QPushButton("Clear")
         self.clear_button.clicked.connect(self.clear_fields)
         
         self.download_button = QPushButton("Download")
         self.download_button.clicked.connect(self.start_download)
         
+        button_layout.addWidget(self.save_log_button)
         button_layout.addStretch(1)
         button_layout.addWidget(self.clear_button)
         button_layout.addWidget(self.download_button)
@@ -145,15 +167,22 @@ class YtDlpGui(QMainWindow):
     
     def paste_url(self):
         """Paste clipboard content to URL entry"""
-        clipboard = QApplication.clipboard()
-        self.url_entry.setText(clipboard.text())
+        # Only read plain text, and no more than any URL could need
+        mime = QApplication.clipboard().mimeData()
+        if not mime.hasText():
+            return
+        self.url_entry.setText(mime.text()[:4096])
     
     def browse_directory(self):
         """Open directory browser dialog"""
         directory = QFileDialog.getExistingDirectory(
             self,
             "Select Output Directory",
-            self.output_dir_entry.text()
+            self.output_dir_entry.text(),
+            # Skip per-entry icon and symlink lookups on large or network folders
+            QFileDialog.ShowDirsOnly
+            | QFileDialog.DontUseCustomDirectoryIcons
+            | QFileDialog.DontResolveSymlinks
         )
         if directory:
             self.output_dir_entry.setText(directory)
@@ -162,40 +191,107 @@ class YtDlpGui(QMainWindow):
         """Show or hide mp4 conversion option based on format selection"""
         self.convert_mp4_check.setVisible(text == 'best')
     
+    def schedule_log_flush(self):
+        """Start the log flush timer unless a flush is already pending"""
+        if not self.log_timer.isActive():
+            self.log_timer.start()
+    
+    def flush_log(self):
+        """Move queued downloader messages into the log and display them"""
+        lines = self.downloader.drain_log()
+        self._log_ring.extend(lines)
+        # Leave the display alone while the log can't be seen
+        if not self.log_text.isVisible() or self.isMinimized():
+            if lines:
+                self._log_stale = True
+            return
+        if self._log_stale:
+            self.log_text.setPlainText('\n'.join(self._log_ring))
+            self.log_text.moveCursor(QTextCursor.End)
+            self._log_stale = False
+        elif lines:
+            self.log_text.appendPlainText('\n'.join(lines))
+    
     def log_message(self, message):
         """Add message to log display"""
-        self.log_text.append(message)
-        # Scroll to the bottom
-        sb = self.log_text.verticalScrollBar()
-        sb.setValue(sb.maximum())
+        # Take in pending worker messages first so the log stays in order
+        self.flush_log()
+        self._log_ring.append(message)
+        if self.log_text.isVisible() and not self.isMinimized():
+            self.log_text.appendPlainText(message)
+        else:
+            self._log_stale = True
+    
+    def showEvent(self, event):
+        """Catch up on log messages queued while the window was hidden"""
+        super().showEvent(event)
+        self.flush_log()
+    
+    def changeEvent(self, event):
+        """Catch up on log messages queued while the window was minimized"""
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange and not self.isMinimized():
+            self.flush_log()
+    
+    def save_log(self):
+        """Save the recent log messages to a text file"""
+        self.flush_log()
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Log",
+            os.path.join(self.output_dir_entry.text(), "yt-dlp-log.txt"),
+            "Text Files (*.txt);;All Files (*)"
+        )
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(self._log_ring))
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Could not save log: {e}")
+    
+    def poll_progress(self):
+        """Show the most recent progress reported by the downloader"""
+        progress = self.downloader.take_progress()
+        if progress:
+            self.update_progress(*progress)
     
     def update_progress(self, status, data):
         """Update progress information"""
         if status == 'downloading' and data:
             self.progress_bar.show()
-            self.status_label.setText(f"Downloading: {data['percent']} at {data['speed']}, ETA: {data['eta']}")
+            self.status_label.setText(data)
         elif status == 'processing':
             self.progress_bar.show()
             self.status_label.setText("Post-processing...")
     
     def download_complete(self):
         """Called when download is complete"""
+        self.discard_progress()
         self.progress_bar.hide()
         self.status_label.setText("Download complete!")
         QMessageBox.information(self, "Success", "Download completed successfully!")
     
     def download_error(self, error_msg):
         """Called when an error occurs during download"""
+        self.discard_progress()
         self.progress_bar.hide()
         self.status_label.setText("Error occurred")
         self.log_message(f"Error: {error_msg}")
         QMessageBox.critical(self, "Error", f"Download failed: {error_msg}")
     
+    def discard_progress(self):
+        """Drop progress left over from the finished download"""
+        # Polling keeps running for any downloads still queued
+        self.downloader.take_progress()
+    
     def clear_fields(self):
         """Clear input fields and reset status"""
         self.url_entry.clear()
         self.status_label.setText("Ready")
         self.log_text.clear()
+        self._log_ring.clear()
+        self._log_stale = False
         self.progress_bar.hide()
     
     def start_download(self):
@@ -208,6 +304,8 @@ class YtDlpGui(QMainWindow):
         # Show progress bar
         self.progress_bar.show()
         self.status_label.setText("Downloading...")
+        if not self.progress_timer.isActive():
+            self.progress_timer.start()
         
         # Get options from GUI
         output_dir = self.output_dir_entry.text()
@@ -237,9 +335,8 @@ def show_dependency_error(message):
 def main():
     """Main function to start the application"""
     # Check dependencies first
-    deps_check = check_dependencies()
-    if deps_check is not True:  # This means deps_check contains (False, error_message)
-        _, error_message = deps_check
+    ok, error_message = check_dependencies()
+    if not ok:
         show_dependency_error(error_message)
     
     app = QApplication(sys.argv)
@@ -1,23 +1,61 @@
 import os
 import threading
-import subprocess
+import queue
 import time
-import yt_dlp
+import shutil
+import importlib.util
+from collections import deque
+
+AUDIO_EXTENSIONS = ('.m4a', '.mp3', '.opus', '.ogg', '.aac', '.flac', '.wav')
+# Codecs QuickTime plays from an mp4 container, as reported by yt-dlp
+MP4_VIDEO_CODECS = ('avc1', 'h264')
+MP4_AUDIO_CODECS = ('mp4a', 'aac')
 
 class YtDlpDownloader:
     def __init__(self, callback_functions=None):
         """Initialize the downloader with callback functions from GUI."""
         self.callbacks = callback_functions or {}
+        self.downloaded_file = None
+        self._vcodec = None
+        self._acodec = None
+        self._log_buffer = deque(maxlen=5000)
+        self._log_lock = threading.Lock()
+        self._latest_progress = None
+        self._progress_lock = threading.Lock()
+        self._ydl = None
+        self._ydl_key = None
+        
+        # Single worker thread that runs queued downloads one at a time
+        self._jobs = queue.Queue()
+        self._worker = threading.Thread(target=self._worker_loop, daemon=True)
+        self._worker.start()
     
     def log_message(self, message):
-        """Send log message to GUI"""
-        if 'log_message' in self.callbacks:
-            self.callbacks['log_message'](message)
+        """Queue log message and notify GUI once per batch"""
+        with self._log_lock:
+            wake = not self._log_buffer
+            self._log_buffer.append(message)
+        if wake and 'log_ready' in self.callbacks:
+            self.callbacks['log_ready']()
+    
+    def drain_log(self):
+        """Return and clear all queued log messages"""
+        with self._log_lock:
+            lines = list(self._log_buffer)
+            self._log_buffer.clear()
+        return lines
     
     def update_progress(self, status, data=None):
-        """Update progress information in GUI"""
-        if 'update_progress' in self.callbacks:
-            self.callbacks['update_progress'](status, data)
+        """Record the latest progress information for the GUI to poll"""
+        with self._progress_lock:
+            self._latest_progress = (status, data)
+    
+    def take_progress(self):
+        """Return and clear the latest progress information, if any"""
+        with self._progress_lock:
+            progress = self._latest_progress
+            self._latest_progress = None
+        return progress
     
     def on_complete(self):
         """Notify GUI when download is complete"""
@@ -31,12 +69,30 @@ class YtDlpDownloader:
     
     def download_video(self, url, output_dir, selected_format, with_subtitles=False, with_thumbnail=False, convert_to_mp4=False):
         """Download video using yt-dlp"""
+        import subprocess
+        
         # Configure yt-dlp options
         ydl_opts = {
             'outtmpl': os.path.join(output_dir, '%(title)s.%(ext)s'),
             'logger': CustomLogger(self),
             'progress_hooks': [self.progress_hook],
+            'postprocessor_hooks': [self.postprocessor_hook],
             'quiet': True,
+            'verbose': False,
+            'no_color': True,
+            # ASCII-only, length-capped filenames
+            'restrictfilenames': True,
+            'trim_file_name': 200,
+            # Avoid extra requests for playlist entries
+            'noplaylist': True,
+            'extract_flat': 'discard_in_playlist',
+            'lazy_playlist': True,
+            # Fetch fragments in parallel and retry transient network errors
+            'concurrent_fragment_downloads': 8,
+            'http_chunk_size': 10 * 1024 * 1024,
+            'retries': 3,
+            'fragment_retries': 3,
+            'socket_timeout': 20,
         }
         
         # Set format-specific options
@@ -77,102 +133,150 @@ class YtDlpDownloader:
         try:
             self.log_message(f"Starting download of {url}")
             self.downloaded_file = None
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
+            self._vcodec = None
+            self._acodec = None
+            ydl = self._get_ydl(ydl_opts, (output_dir, selected_format, with_subtitles, with_thumbnail))
+            ydl.download([url])
 
             if selected_format == 'best' and convert_to_mp4 and self.downloaded_file:
 
-                time.sleep(2)
-
+                # Files that are already mp4 are kept as they are
                 base, ext = os.path.splitext(self.downloaded_file)
                 if ext.lower() != '.mp4':
+                    if not self.wait_for_file(self.downloaded_file):
+                        self.on_error(f"Downloaded file not found: {self.downloaded_file}")
+                        return
+
                     mp4_file = base + '.mp4'
+                    # Write to a temporary name and swap it in once complete
+                    part_file = mp4_file + '.part'
                     try:
-
-                        # Detect whether the file has a video stream
-                        probe = subprocess.run(
-                            [
-                                'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-                                '-show_entries', 'stream=codec_type', '-of', 'csv=p=0',
-                                self.downloaded_file
-                            ],
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE
-                        )
-                        has_video = probe.stdout.strip() != b''
-
-                        # Build ffmpeg command based on presence of video stream
-                        if has_video:
-                            cmd = [
-                                'ffmpeg', '-y', '-i', self.downloaded_file,
-                                '-c:v', 'libx264', '-preset', 'ultrafast',
-                                '-c:a', 'copy', mp4_file
-                            ]
+                        # Copy streams that mp4 players handle as they are,
+                        # re-encode the rest to H.264/AAC
+                        if self._vcodec:
+                            has_video = self._vcodec != 'none'
                         else:
-                            cmd = [
-                                'ffmpeg', '-y', '-i', self.downloaded_file,
-                                '-vn', '-c:a', 'copy', mp4_file
-                            ]
-
+                            has_video = ext.lower() not in AUDIO_EXTENSIONS
+                        if not has_video:
+                            video_args = ['-vn']
+                        elif (self._vcodec or '').lower().startswith(MP4_VIDEO_CODECS):
+                            video_args = ['-c:v', 'copy']
+                        else:
+                            video_args = ['-c:v', 'libx264', '-preset', 'ultrafast']
+                        if (self._acodec or '').lower().startswith(MP4_AUDIO_CODECS):
+                            audio_args = ['-c:a', 'copy']
+                        else:
+                            audio_args = ['-c:a', 'aac']
                         subprocess.run(
-                            cmd,
-
+                            [
+                                'ffmpeg', '-y', '-nostdin', '-hide_banner', '-loglevel', 'error', '-i', self.downloaded_file,
+                                *video_args, *audio_args, '-movflags', '+faststart', '-f', 'mp4', part_file
+                            ],
                             check=True,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL
                         )
+                        os.replace(part_file, mp4_file)
                         os.remove(self.downloaded_file)
                         self.log_message(f"Converted to mp4: {os.path.basename(mp4_file)}")
                     except subprocess.SubprocessError as e:
                         self.on_error(f"ffmpeg conversion failed: {e}")
                         return
+                    finally:
+                        # Never leave a partial mp4 behind, whatever failed
+                        if os.path.exists(part_file):
+                            os.remove(part_file)
 
             self.on_complete()
         except Exception as e:
             error_msg = str(e)
             self.on_error(error_msg)
     
+    def _get_ydl(self, ydl_opts, key):
+        """Return a YoutubeDL instance, reusing the last one if its options match"""
+        # Imported here so the GUI doesn't wait on yt-dlp's extractor loading
+        import yt_dlp
+        
+        # Format selection and postprocessors are set up when YoutubeDL is
+        # created, so a change in options needs a new instance
+        if self._ydl is None or self._ydl_key != key:
+            if self._ydl is not None:
+                self._ydl.close()
+            self._ydl = yt_dlp.YoutubeDL(ydl_opts)
+            self._ydl_key = key
+        return self._ydl
+    
+    def wait_for_file(self, path, attempts=20):
+        """Wait until the file can be opened and its size has stopped changing, False if it's missing"""
+        for _ in range(attempts):
+            try:
+                open(path, 'rb').close()
+                size = os.path.getsize(path)
+                time.sleep(0.05)
+                if os.path.getsize(path) == size:
+                    return True
+            except FileNotFoundError:
+                return False
+            except OSError:
+                # Still locked by another process, try again shortly
+                time.sleep(0.1)
+        return True
+    
     def start_download(self, url, output_dir, selected_format, with_subtitles=False, with_thumbnail=False, convert_to_mp4=False):
-        """Start the download process in a separate thread"""
-        download_thread = threading.Thread(
-            target=self.download_video,
-            args=(url, output_dir, selected_format, with_subtitles, with_thumbnail, convert_to_mp4)
-        )
-        download_thread.daemon = True
-        download_thread.start()
+        """Queue the download for the worker thread"""
+        self._jobs.put((url, output_dir, selected_format, with_subtitles, with_thumbnail, convert_to_mp4))
+    
+    def _worker_loop(self):
+        """Run queued downloads in order"""
+        while True:
+            args = self._jobs.get()
+            # Keep the only worker alive whatever goes wrong with one download
+            try:
+                self.download_video(*args)
+            except Exception as e:
+                self.on_error(str(e))
     
     def progress_hook(self, d):
         """Progress hook for yt-dlp"""
         if d['status'] == 'downloading':
-            # Extract download progress information
+            # Build the status text here so the GUI only has to display it
             try:
                 percent = d.get('_percent_str', 'N/A')
                 speed = d.get('_speed_str', 'N/A')
                 eta = d.get('_eta_str', 'N/A')
                 
-                progress_data = {
-                    'percent': percent,
-                    'speed': speed,
-                    'eta': eta
-                }
-                self.update_progress('downloading', progress_data)
+                self.update_progress('downloading', f"Downloading: {percent} at {speed}, ETA: {eta}")
             except:
                 pass
         
         elif d['status'] == 'finished':
             filename = d.get('filename', 'Unknown')
             self.downloaded_file = filename
+            info = d.get('info_dict', {})
+            self._vcodec = info.get('vcodec')
+            self._acodec = info.get('acodec')
             self.log_message(f"Download finished: {os.path.basename(filename)}")
             self.update_progress('processing', None)
 
+    def postprocessor_hook(self, d):
+        """Postprocessor hook for yt-dlp"""
+        # Merged downloads only reach their final file after postprocessing,
+        # and the part files reported to progress_hook are deleted by then
+        if d['status'] == 'finished':
+            info = d.get('info_dict', {})
+            if info.get('filepath'):
+                self.downloaded_file = info['filepath']
+                self._vcodec = info.get('vcodec')
+                self._acodec = info.get('acodec')
+
 class CustomLogger:
     """Custom logger for yt-dlp that forwards messages to the downloader"""
     def __init__(self, downloader):
         self.downloader = downloader
     
     def debug(self, msg):
-        if not msg.startswith('[debug] '):
-            self.info(msg)
+        # With quiet set, yt-dlp sends all its routine output here; drop it
+        pass
     
     def info(self, msg):
         self.downloader.log_message(msg)
@@ -183,20 +287,34 @@ class CustomLogger:
     def error(self, msg):
         self.downloader.log_message(f"Error: {msg}")
 
+DEPS_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'ytdlp-gui', 'deps.ok')
+DEPS_CACHE_MAX_AGE = 7 * 24 * 60 * 60  # One week
+
 def check_dependencies():
-    """Check if required dependencies are installed"""
+    """Check if required dependencies are installed, returning (ok, error_message)"""
+    # Skip the check if it passed recently
     try:
-        import yt_dlp
-    except ImportError:
+        if time.time() - os.path.getmtime(DEPS_CACHE_FILE) < DEPS_CACHE_MAX_AGE:
+            return True, ""
+    except OSError:
+        pass
+    
+    if importlib.util.find_spec('yt_dlp') is None:
         return False, "yt-dlp is not installed. Please install it with 'pip install yt-dlp'"
     
     # Check if ffmpeg is installed
-    try:
-        subprocess.run(['ffmpeg', '-version'], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except (subprocess.SubprocessError, FileNotFoundError):
+    if shutil.which('ffmpeg') is None:
         return False, "FFmpeg is not installed. Please install it with 'brew install ffmpeg'"
     
-    return True
+    # Remember the successful check for later launches
+    try:
+        os.makedirs(os.path.dirname(DEPS_CACHE_FILE), exist_ok=True)
+        with open(DEPS_CACHE_FILE, 'w'):
+            pass
+    except OSError:
+        pass
+    
+    return True, ""
 
 if __name__ == "__main__":
     # This will only run if main.py is run directly